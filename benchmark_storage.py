@@ -0,0 +1,81 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from experiment_merge import serialize_experiment_data
+from form_schema import FIELDS
+from storage import DuckDBStorage, SQLiteStorage, duckdb
+
+
+def _random_row(rng, num):
+    row = {}
+    for f in FIELDS:
+        if f.column == "#Num":
+            row[f.column] = str(num)
+        elif f.column == "Date":
+            row[f.column] = (datetime(2024, 1, 1) + timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d")
+        elif f.options:
+            row[f.column] = rng.choice(f.options)
+        else:
+            row[f.column] = rng.choice(["N/A", str(round(rng.uniform(0, 100), 2))])
+    return row
+
+
+def populate(storage, experiments, rows_per_experiment, users, seed=0):
+    """Fill a fresh database with synthetic experiments."""
+    rng = random.Random(seed)
+    storage.init_db()
+    for i in range(experiments):
+        email = f"user{i % users}@lab.test"
+        storage.add_user(email)
+        rows = [_random_row(rng, rng.randrange(1, rows_per_experiment * 2)) for _ in range(rows_per_experiment)]
+        storage.save_experiment(email, "Type 1", f"Experiment {i}", datetime.now().isoformat(), serialize_experiment_data(rows))
+
+
+def _timed(workload):
+    start = time.perf_counter()
+    workload()
+    return time.perf_counter() - start
+
+
+def run_workloads(storage, users):
+    """Time the same workloads against one storage backend."""
+    emails = [f"user{i}@lab.test" for i in range(users)]
+    all_ids = [row[0] for row in storage.list_all_experiments()]
+    half_ids = all_ids[::2]
+    return {
+        "list per user": _timed(lambda: [storage.get_experiments(email) for email in emails]),
+        "merge all (first)": _timed(lambda: storage.merged_experiments()),
+        "merge all": _timed(lambda: storage.merged_experiments()),
+        "merge half": _timed(lambda: storage.merged_experiments(half_ids)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare storage backends on the same workloads.")
+    parser.add_argument("--experiments", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=20, help="Rows per experiment")
+    parser.add_argument("--users", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        backends = [("sqlite", SQLiteStorage(db_file))]
+        if duckdb is not None:
+            backends.append(("duckdb", DuckDBStorage(db_file, analytics_file=os.path.join(tmp, "bench.duckdb"))))
+        else:
+            print("duckdb is not installed; only the SQLite backend is measured.")
+
+        populate(backends[0][1], args.experiments, args.rows, args.users)
+        results = {name: run_workloads(storage, args.users) for name, storage in backends}
+
+    print(f"{'workload':<20}" + "".join(f"{name:>12}" for name, _ in backends))
+    for workload in results["sqlite"]:
+        print(f"{workload:<20}" + "".join(f"{results[name][workload] * 1000:>10.1f}ms" for name, _ in backends))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import os
+import sqlite3
+import time
+import zlib
+from datetime import datetime, timedelta
+
+DB_FILE = "experiments.db"
+ARCHIVE_FILE = "experiments_archive.db"
+DEFAULT_MAX_AGE_DAYS = 180
+
+# PRAGMA auto_vacuum value for INCREMENTAL
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def compress_payload(data):
+    """Compress an experiment payload for archiving."""
+    if data is None:
+        return None
+    return zlib.compress(data.encode("utf-8"), 9)
+
+
+def decompress_payload(blob):
+    """Inverse of compress_payload."""
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def _connect_with_archive(db_file, archive_file):
+    """Open the main database with the archive attached as 'archive'."""
+    conn = sqlite3.connect(db_file)
+    conn.create_function("compress_payload", 1, compress_payload, deterministic=True)
+    conn.create_function("decompress_payload", 1, decompress_payload, deterministic=True)
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_file,))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive.archived_experiments (
+            id INTEGER PRIMARY KEY,
+            email TEXT,
+            experiment_type TEXT,
+            experiment_name TEXT,
+            date TEXT,
+            data BLOB,
+            version INTEGER NOT NULL DEFAULT 1,
+            archived_at TEXT
+        )
+    """)
+    # Archives created before versioning lack the column
+    columns = {row[1] for row in conn.execute("PRAGMA archive.table_info(archived_experiments)")}
+    if "version" not in columns:
+        conn.execute("ALTER TABLE archive.archived_experiments ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archived_experiments_email ON archived_experiments (email)")
+    return conn
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def measure_read_latency(db_file, repeat=5):
+    """Average seconds to run the per-user experiment listing for every user."""
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT email FROM experiments")
+    emails = [row[0] for row in cursor.fetchall()]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for email in emails:
+            cursor.execute("SELECT id, experiment_type, experiment_name, date, data FROM experiments WHERE email = ?", (email,))
+            cursor.fetchall()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed / repeat
+
+
+def vacuum_and_analyze(db_file):
+    """Release free pages and refresh planner statistics.
+
+    The first run switches the file to incremental auto-vacuum, which needs
+    one full VACUUM; later runs only reclaim the free-list incrementally.
+    """
+    conn = sqlite3.connect(db_file)
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if auto_vacuum != _AUTO_VACUUM_INCREMENTAL:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        # execute() steps the pragma only once (one page); executescript runs it to completion
+        conn.executescript("PRAGMA incremental_vacuum;")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def archive_old_experiments(db_file=DB_FILE, archive_file=ARCHIVE_FILE, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """Move experiments not modified for max_age_days into the compressed archive.
+
+    Returns a report with the number of archived experiments, the bytes
+    reclaimed in the main database and the hot read latency before and after.
+    """
+    size_before = _file_size(db_file)
+    latency_before = measure_read_latency(db_file)
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+
+    conn = _connect_with_archive(db_file, archive_file)
+    with conn:  # one transaction across both files
+        conn.execute("""
+            INSERT INTO archive.archived_experiments (id, email, experiment_type, experiment_name, date, data, version, archived_at)
+            SELECT id, email, experiment_type, experiment_name, date, compress_payload(data), version, ?
+            FROM main.experiments WHERE coalesce(last_modified, date) < ?
+        """, (datetime.now().isoformat(), cutoff))
+        archived = conn.execute("DELETE FROM main.experiments WHERE coalesce(last_modified, date) < ?", (cutoff,)).rowcount
+    conn.execute("DETACH DATABASE archive")
+    conn.close()
+
+    vacuum_and_analyze(db_file)
+
+    size_after = _file_size(db_file)
+    latency_after = measure_read_latency(db_file)
+    return {
+        "archived_experiments": archived,
+        "db_size_before": size_before,
+        "db_size_after": size_after,
+        "bytes_reclaimed": size_before - size_after,
+        "archive_size": _file_size(archive_file),
+        "read_latency_before": latency_before,
+        "read_latency_after": latency_after,
+    }
+
+
+def get_archived_experiments(email, db_file=DB_FILE, archive_file=ARCHIVE_FILE):
+    """Retrieve all archived experiments for a specific user."""
+    if not os.path.exists(archive_file):
+        return []
+    conn = _connect_with_archive(db_file, archive_file)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, experiment_type, experiment_name, date, decompress_payload(data)
+        FROM archive.archived_experiments WHERE email = ?
+    """, (email,))
+    experiments = cursor.fetchall()
+    conn.close()
+    return experiments
+
+
+def restore_experiment(exp_id, db_file=DB_FILE, archive_file=ARCHIVE_FILE):
+    """Move one archived experiment back into the main database.
+
+    Restoring counts as a modification, so the next archive run keeps it.
+    """
+    conn = _connect_with_archive(db_file, archive_file)
+    with conn:
+        conn.execute("""
+            INSERT INTO main.experiments (id, email, experiment_type, experiment_name, date, data, version, last_modified)
+            SELECT id, email, experiment_type, experiment_name, date, decompress_payload(data), version, ?
+            FROM archive.archived_experiments WHERE id = ?
+        """, (datetime.now().isoformat(), exp_id))
+        conn.execute("DELETE FROM archive.archived_experiments WHERE id = ?", (exp_id,))
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress and archive old experiments, then vacuum the database.")
+    parser.add_argument("--db", default=DB_FILE, help="Main experiments database")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="Archive database file")
+    parser.add_argument("--max-age-days", type=int, default=DEFAULT_MAX_AGE_DAYS,
+                        help="Archive experiments not modified for this many days")
+    args = parser.parse_args()
+
+    # Bring older databases up to the current schema (last_modified column)
+    from storage import SQLiteStorage
+    SQLiteStorage(args.db).init_db()
+
+    report = archive_old_experiments(args.db, args.archive, args.max_age_days)
+    print(f"Archived experiments: {report['archived_experiments']}")
+    print(f"Database size: {report['db_size_before']} -> {report['db_size_after']} bytes "
+          f"({report['bytes_reclaimed']} reclaimed)")
+    print(f"Archive size: {report['archive_size']} bytes")
+    print(f"Read latency: {report['read_latency_before'] * 1000:.2f} ms -> "
+          f"{report['read_latency_after'] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
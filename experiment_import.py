@@ -0,0 +1,84 @@
+from collections import defaultdict, deque
+from datetime import date, datetime
+
+from openpyxl import load_workbook
+
+from experiment_merge import DEFAULT_MERGE_KEY
+
+
+def cell_text(value):
+    """Normalize a cell so stored strings and values Excel re-typed compare equal."""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def read_workbook_rows(file, sheet_name=None):
+    """Stream the rows of an exported workbook as dicts keyed by the header row."""
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = [cell_text(value) for value in next(rows, ())]
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            yield {column: cell_text(value) for column, value in zip(header, values) if column}
+    finally:
+        workbook.close()
+
+
+def diff_rows(stored_rows, imported_rows, key=DEFAULT_MERGE_KEY):
+    """Cell-level diff of an imported sheet against the stored rows.
+
+    Rows are matched by key first (hash join). Imported rows whose key found
+    no match, e.g. because a key cell was corrected offline, then fall back
+    to the stored row at the same position if that row is still unmatched.
+    Returns (changes, added, unmatched): changes is a list of
+    (row index, column, old value, new value), added holds imported rows that
+    match no stored row, and unmatched lists the indices of stored rows the
+    sheet did not match (they are kept as they are).
+    """
+    key = tuple(key)
+    by_key = defaultdict(deque)
+    for index, row in enumerate(stored_rows):
+        by_key[tuple(cell_text(row.get(column)) for column in key)].append(index)
+
+    matched = {}  # stored index -> imported row
+    leftovers = []
+    for position, row in enumerate(imported_rows):
+        row_key = tuple(row.get(column, "") for column in key)
+        matches = by_key.get(row_key) if any(row_key) else None
+        if matches:
+            matched[matches.popleft()] = row
+        else:
+            leftovers.append((position, row))
+
+    added = []
+    for position, row in leftovers:
+        if position < len(stored_rows) and position not in matched:
+            matched[position] = row
+        else:
+            added.append(row)
+
+    changes = []
+    for index in sorted(matched):
+        stored = stored_rows[index]
+        for column, new in matched[index].items():
+            old = stored.get(column)
+            if cell_text(old) != new:
+                changes.append((index, column, old, new))
+    unmatched = [index for index in range(len(stored_rows)) if index not in matched]
+    return changes, added, unmatched
+
+
+def apply_diff(stored_rows, changes, added):
+    """New row list with the changed cells replaced and added rows appended."""
+    rows = [dict(row) for row in stored_rows]
+    for index, column, _, new in changes:
+        rows[index][column] = new
+    return rows + list(added)
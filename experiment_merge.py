@@ -0,0 +1,121 @@
+import ast
+import io
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+# Columns that identify one row of an experiment across technicians
+DEFAULT_MERGE_KEY = ("#Num", "Labeling", "Date")
+
+# Keep well below SQLite's bound-parameter limit
+_ID_CHUNK_SIZE = 500
+
+# Parsed payloads by (database file, experiment id): (version, payload hash, rows).
+# Parsing dominates merge time. The hash catches a database that was recreated
+# or restored under a running server, where ids and versions start over.
+_parsed_rows = {}
+
+
+def serialize_experiment_data(rows):
+    """Convert a list of row dicts into the stored payload (JSON)."""
+    return json.dumps(rows, ensure_ascii=False, default=str)
+
+
+def parse_experiment_data(data):
+    """Convert a stored experiment payload back into a list of row dicts."""
+    if not data:
+        return []
+    try:
+        rows = json.loads(data)
+    except ValueError:
+        # Payloads saved before JSON storage are Python literals
+        rows = ast.literal_eval(data)
+    return [dict(row) for row in rows]
+
+
+def _cached_rows(db_file, exp_id, version, data):
+    cache_key = (os.path.abspath(db_file), exp_id)
+    data_hash = hash(data)
+    cached = _parsed_rows.get(cache_key)
+    if cached is None or cached[0] != version or cached[1] != data_hash:
+        cached = (version, data_hash, parse_experiment_data(data))
+        _parsed_rows[cache_key] = cached
+    return cached[2]
+
+
+def load_experiments(db_file, experiment_ids=None):
+    """Load (id, name, rows) for the given experiment ids, or for all experiments.
+
+    Experiments come back ordered by (date, id). The returned rows are shared
+    with the parse cache and must not be modified.
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    records = []
+    if experiment_ids is None:
+        cursor.execute("SELECT id, experiment_name, data, version, date FROM experiments")
+        records.extend(cursor.fetchall())
+    else:
+        experiment_ids = list(experiment_ids)
+        for start in range(0, len(experiment_ids), _ID_CHUNK_SIZE):
+            chunk = experiment_ids[start:start + _ID_CHUNK_SIZE]
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(
+                f"SELECT id, experiment_name, data, version, date FROM experiments WHERE id IN ({placeholders})",
+                chunk,
+            )
+            records.extend(cursor.fetchall())
+    conn.close()
+    # Sort after all chunks are fetched so "later experiment wins" does not depend on chunking
+    records.sort(key=lambda record: (record[4] or "", record[0]))
+    return [(exp_id, exp_name, _cached_rows(db_file, exp_id, version, data)) for exp_id, exp_name, data, version, _ in records]
+
+
+def key_value(value):
+    """Normalize a key cell so that '1', ' 1 ' and 1 match."""
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def merge_experiments(experiments, key=DEFAULT_MERGE_KEY, source_column="Source experiment"):
+    """Merge the rows of several experiments into one master DataFrame.
+
+    Columns are aligned to the union of all source columns (in first-seen
+    order). Rows sharing the same key are de-duplicated, the row from the
+    later experiment winning. Rows with an empty key are always kept.
+    """
+    key = tuple(key)
+    columns = {}  # dict used as an insertion-ordered set
+    if source_column:
+        columns[source_column] = None
+    for column in key:
+        columns[column] = None
+
+    merged = {}  # key tuple -> row, hash join on the merge key
+    unkeyed = []
+    for _, exp_name, rows in experiments:
+        for row in rows:
+            for column in row:
+                columns.setdefault(column, None)
+            if source_column:
+                row = {source_column: exp_name, **row}
+            row_key = tuple(key_value(row.get(column)) for column in key)
+            if any(row_key):
+                merged.pop(row_key, None)  # re-insert so order follows the winning row
+                merged[row_key] = row
+            else:
+                unkeyed.append(row)
+
+    return pd.DataFrame.from_records(list(merged.values()) + unkeyed, columns=list(columns))
+
+
+def merged_to_excel_bytes(df, sheet_name="Master"):
+    """Write the merged DataFrame to a single-sheet .xlsx file in memory."""
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name=sheet_name, index=False)
+    excel_buffer.seek(0)
+    return excel_buffer.getvalue()
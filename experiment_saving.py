@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pandas as pd
+
+from experiment_merge import parse_experiment_data, serialize_experiment_data
+from experiment_versions import SaveConflict, merge_appended_rows, merge_names, subtract_rows
+from form_schema import COLUMNS
+
+MISSING_EXPERIMENT = "This experiment no longer exists (it may have been archived)."
+
+
+def open_experiment(st, exp_id, exp_type, exp_name, exp_data, exp_version):
+    """Load a stored experiment into the session for editing."""
+    st.session_state.experiment_id = exp_id
+    st.session_state.experiment_type = exp_type
+    st.session_state.experiment_name = exp_name
+    st.session_state.experiment_data = parse_experiment_data(exp_data)
+    # Remember what was loaded so concurrent saves can be merged
+    st.session_state.experiment_version = exp_version
+    st.session_state.experiment_base_data = list(st.session_state.experiment_data)
+    st.session_state.experiment_base_name = exp_name
+    st.session_state.page = "experiment_form"
+
+
+def leave_experiment_form(st):
+    """Clear the edited experiment from the session and go back home."""
+    for key in ("experiment_id", "experiment_data", "experiment_name", "experiment_version",
+                "experiment_base_data", "experiment_base_name", "save_conflict", "import_preview"):
+        st.session_state.pop(key, None)
+    st.session_state.page = "welcome"
+
+
+def _accept_stored_state(st, rows, name, version):
+    st.session_state.experiment_data = rows
+    st.session_state.experiment_name = name
+    st.session_state.experiment_base_data = list(rows)
+    st.session_state.experiment_base_name = name
+    st.session_state.experiment_version = version
+    st.session_state.pop("save_conflict", None)
+
+
+def render_save_conflict(st, storage, experiment_name):
+    """Show the conflict prompt if a save was rejected; return False if the page should stop."""
+    conflict = st.session_state.get("save_conflict")
+    if conflict is None:
+        return True
+    st.warning("This experiment was changed by someone else since you opened it. Their version:")
+    st.write(pd.DataFrame(conflict.current_rows).reindex(columns=COLUMNS))
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Keep mine", key="conflict_keep_mine"):
+            try:
+                storage.update_experiment(conflict.exp_id, experiment_name,
+                                          serialize_experiment_data(st.session_state.experiment_data),
+                                          conflict.current_version)
+            except SaveConflict as newer:
+                if newer.current_version is None:
+                    st.error(MISSING_EXPERIMENT)
+                    return False
+                st.session_state.save_conflict = newer
+                st.rerun()
+            leave_experiment_form(st)
+            st.rerun()
+    with col2:
+        if st.button("Keep theirs", key="conflict_keep_theirs"):
+            _accept_stored_state(st, list(conflict.current_rows), conflict.current_name, conflict.current_version)
+            st.rerun()
+    with col3:
+        if st.button("Keep both", key="conflict_keep_both"):
+            mine = subtract_rows(st.session_state.experiment_data, conflict.current_rows)
+            _accept_stored_state(st, list(conflict.current_rows), conflict.current_name, conflict.current_version)
+            # Our rows and name stay unsaved edits on top of their version
+            st.session_state.experiment_data = conflict.current_rows + mine
+            st.session_state.experiment_name = experiment_name
+            st.rerun()
+    return True
+
+
+def save_experiment(st, storage, experiment_name):
+    """Save the edited experiment, merging concurrent appends; return False if the page should stop."""
+    serialized_data = serialize_experiment_data(st.session_state.experiment_data)
+
+    if st.session_state.get("experiment_id") is None:
+        storage.save_experiment(st.session_state.current_user, st.session_state.experiment_type, experiment_name,
+                                datetime.now().isoformat(), serialized_data)
+        st.success(f"Experiment '{experiment_name}' saved successfully!")
+        return True
+
+    exp_id = st.session_state.experiment_id
+    try:
+        storage.update_experiment(exp_id, experiment_name, serialized_data, st.session_state.experiment_version)
+        st.success(f"Experiment '{experiment_name}' updated successfully!")
+        return True
+    except SaveConflict as conflict:
+        if conflict.current_version is None:
+            st.error(MISSING_EXPERIMENT)
+            return False
+        # Both sides only appended rows: merge without asking
+        merged_rows = merge_appended_rows(st.session_state.experiment_base_data, st.session_state.experiment_data,
+                                          conflict.current_rows)
+        merged_name = merge_names(st.session_state.experiment_base_name, experiment_name, conflict.current_name)
+        try:
+            if merged_rows is None or merged_name is None:
+                raise conflict
+            storage.update_experiment(exp_id, merged_name, serialize_experiment_data(merged_rows),
+                                      conflict.current_version)
+            st.success(f"Experiment '{merged_name}' merged with changes saved by someone else.")
+            return True
+        except SaveConflict as unresolved:
+            if unresolved.current_version is None:
+                st.error(MISSING_EXPERIMENT)
+                return False
+            st.session_state.save_conflict = unresolved
+            st.rerun()
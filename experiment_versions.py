@@ -0,0 +1,53 @@
+class SaveConflict(Exception):
+    """Raised when an experiment changed in the database since it was opened."""
+
+    def __init__(self, exp_id, current_name, current_rows, current_version):
+        super().__init__(f"Experiment {exp_id} was changed by someone else")
+        self.exp_id = exp_id
+        self.current_name = current_name
+        self.current_rows = current_rows
+        self.current_version = current_version
+
+
+def appended_rows(base, rows):
+    """Rows added on top of base, or None if base itself was modified."""
+    if rows[:len(base)] != base:
+        return None
+    return rows[len(base):]
+
+
+def subtract_rows(rows, other):
+    """Rows minus other as a multiset: each row in other cancels one equal row."""
+    # Rows are dicts (unhashable), so match them one by one
+    remaining = list(other)
+    result = []
+    for row in rows:
+        if row in remaining:
+            remaining.remove(row)
+        else:
+            result.append(row)
+    return result
+
+
+def merge_appended_rows(base, ours, theirs):
+    """Three-way merge of two row lists that both started from base.
+
+    Succeeds when each side only appended rows: the result is theirs
+    followed by our new rows. A row both sides added is kept once per pair,
+    so identical replicate rows we added beyond theirs are not lost.
+    Returns None when the edits conflict.
+    """
+    ours_added = appended_rows(base, ours)
+    theirs_added = appended_rows(base, theirs)
+    if ours_added is None or theirs_added is None:
+        return None
+    return theirs + subtract_rows(ours_added, theirs_added)
+
+
+def merge_names(base, ours, theirs):
+    """Three-way merge of the experiment name; None on conflict."""
+    if ours == theirs or ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+    return None
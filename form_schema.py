@@ -0,0 +1,245 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+NUMBER_PLACEHOLDER = "Number (If used) or N/A"
+
+# Values accepted as "not used" for optional fields
+NA_VALUES = {"", "N/A", "NA", "N.A", "NONE", "-"}
+
+
+@dataclass(frozen=True)
+class Field:
+    """One form input, its stored column and how its values are validated."""
+    key: str
+    column: str
+    label: str = None
+    widget: str = "text"  # "text", "select" or "date"
+    options: tuple = ()
+    placeholder: str = NUMBER_PLACEHOLDER
+    help: str = None
+    kind: str = "number"  # "number", "integer", "text" or "choice"
+    min_value: float = None
+    max_value: float = None
+    required: bool = False
+
+    @property
+    def widget_label(self):
+        return self.label or self.column
+
+
+@dataclass(frozen=True)
+class Section:
+    """A titled block of the form; each row is rendered as one set of columns."""
+    title: str
+    rows: tuple
+    widths: dict = field(default_factory=dict)  # row index -> st.columns spec
+
+
+def _text(key, column, placeholder="Name (If used) or N/A", **kwargs):
+    return Field(key, column, placeholder=placeholder, kind="text", **kwargs)
+
+
+def _select(key, column, options, **kwargs):
+    return Field(key, column, widget="select", options=tuple(options), placeholder=None, kind="choice", **kwargs)
+
+
+def _temp(key, column, **kwargs):
+    return Field(key, column, min_value=-80, max_value=250, **kwargs)
+
+
+def _percent(key, column, **kwargs):
+    return Field(key, column, min_value=0, max_value=100, **kwargs)
+
+
+def _positive(key, column, **kwargs):
+    return Field(key, column, min_value=0, **kwargs)
+
+
+SECTIONS = (
+    Section("Procedure - Settings", (
+        (
+            Field("procedure_num", "#Num", placeholder="1-Infinity", kind="integer", min_value=1, required=True),
+            Field("procedure_date", "Date", widget="date", placeholder=None, kind="text"),
+            _text("procedure_labeling", "Labeling", placeholder=None),
+            _select("protein_type", "Protein type", ["Type A", "Type B", "Type C"]),
+            _percent("protein_concentration", "Concentration [wt/wt%]", placeholder=None),
+        ),
+    )),
+    Section("Procedure - Physical Treatments", (
+        (
+            _positive("right_valve", "Right valve [bar]"),
+            _positive("left_valve", "Left valve 2 [bar]"),
+            _temp("temp_after_HPH", "Temp after HPH [°C]"),
+            _percent("HPH_fraction", "HPH fraction [%]"),
+        ),
+        (
+            _temp("initial_water_temp", "Initial water temp"),
+            _text("acid_name", "Acid name"),
+        ),
+        (
+            _temp("mixing_temp", "Mixing temp[°C]"),
+            _positive("mixing_time", "Mixing time"),
+        ),
+        (_percent("heat_treatment_fraction", "Heat treatment fraction[%]"),),
+        (Field("ph", "pH", min_value=0, max_value=14),),
+    )),
+    Section("Black box ? + Procedure - Enzymes Hydrolyzing", (
+        (
+            _select("enz_YN", "Y/N", ["Yes", "No"]),
+            _positive("enz_num", "Enz num."),
+        ),
+        (_select("enz_name", "Name", ["Enzyme A", "Enzyme B"]),),
+        (
+            _percent("enz_concentration", "Concentration [%]"),
+            _positive("enz_added", "Added enz [g]"),
+        ),
+        (
+            _temp("enz_addition_temp", "Addition temp [°C]"),
+            _positive("enz_ino_time", "Ino. time [min]"),
+        ),
+        (
+            _temp("enz_ino_temp", "Ino. temp. [°C]"),
+            _positive("enz_stirring", "stirring [RPM]"),
+        ),
+        (_percent("black_box_protein_fraction", "black box protein fraction[%]"),),
+    )),
+    Section("Procedure - Enzymes Crosslinking", (
+        (_select("cross_enz_name", "Crosslinker Name", ["Crosslinker X", "Crosslinker Y"], label="Name"),),
+        (
+            _positive("cross_enz_num", "Crosslinker Enz num.", label="Enz num."),
+            _percent("cross_enz_concentration", "Crosslinker Concentration [%]", label="Concentration [%]"),
+        ),
+        (
+            _positive("cross_enz_added", "Crosslinker Added enz [g]", label="Added enz [g]"),
+            _temp("cross_enz_addition_temp", "Crosslinker Addition temp [°C]", label="Addition temp [°C]"),
+        ),
+        (
+            _positive("cross_enz_ino_time", "Crosslinker Ino. time [min]", label="Inc. time [min]"),
+            _temp("cross_enz_ino_temp", "Crosslinker Ino. temp. [°C]", label="Inc. temp. [°C]"),
+        ),
+        (_positive("cross_enz_stirring", "Crosslinker stirring [RPM]", label="stirring [RPM]"),),
+    ), widths={0: 2}),
+    Section("Gel / Drying process", (
+        (_select("gel_or_drying", "G/D", ["Drying", "Gel"]),),
+        (
+            _select("o_n_incubation", "o.n incubation at 4 °C (Y/N)", ["Yes", "No"]),
+            _select("drying_method", "Drying type", ["Freeze dry", "Spray dry", "N/A"]),
+        ),
+    ), widths={0: 2}),
+    Section("Gel Functionality", (
+        (
+            _text("fresh_rehydrated", "Fresh/rehydrated", placeholder="Enter value",
+                  help="Specify whether the gel is fresh or rehydrated."),
+            _positive("added_protein", "Added protein?", placeholder="Number (if used) or N/A",
+                      help="Enter the amount of added protein or specify 'N/A'."),
+            _text("added_protein_type", "Added protein type", placeholder="Type (if used) or N/A",
+                  help="Specify the type of added protein or 'N/A'."),
+            _text("meal_water_ratio", "Meal:water:added protein ratio", placeholder="Ratio (if used) or N/A",
+                  help="Provide the ratio of meal to water to added protein."),
+            _text("rehydration_equipment", "Rehydration equipment", placeholder="Enter equipment",
+                  help="Specify the equipment used for rehydration."),
+            _positive("stress_max_load", "Stress at Maximum Load (KPa)", placeholder="Insert average stress",
+                      help="Enter the average stress at maximum load in KPa."),
+            _percent("strain_max_load", "Percentage Strain at Maximum Load", placeholder="Insert average strain",
+                     help="Enter the average strain percentage at maximum load."),
+        ),
+    ), widths={0: [1.5, 1.5, 1.5, 2, 2, 2, 2]}),
+    Section("TPA & Sensory Tests", (
+        (
+            Field("tpa1", "TPA1", placeholder="Enter TPA1 value",
+                  help="Enter the first TPA (Texture Profile Analysis) value."),
+            Field("tpa", "TPA", placeholder="Enter TPA value",
+                  help="Enter the second TPA (Texture Profile Analysis) value."),
+            _positive("chewiness", "Chewiness", placeholder="Enter chewiness value",
+                      help="Provide a chewiness score based on sensory analysis."),
+            _positive("hardness", "Hardness", placeholder="Enter hardness value",
+                      help="Provide a hardness score based on sensory analysis."),
+            _positive("juiciness", "Juiciness", placeholder="Enter juiciness value",
+                      help="Provide a juiciness score based on sensory analysis."),
+            _positive("mushiness", "Mushiness", placeholder="Enter mushiness value",
+                      help="Provide a mushiness score based on sensory analysis."),
+        ),
+    )),
+)
+
+FIELDS = tuple(f for section in SECTIONS for row in section.rows for f in row)
+
+# Stored columns and Excel export headers, in form order
+COLUMNS = [f.column for f in FIELDS]
+
+
+def render_form_sections(st):
+    """Render every schema section inside the current form and return {column: value}."""
+    values = {}
+    for section in SECTIONS:
+        st.subheader(section.title)
+        for index, row in enumerate(section.rows):
+            if len(row) == 1 and index not in section.widths:
+                values[row[0].column] = _render_field(st, row[0])
+                continue
+            for col, f in zip(st.columns(section.widths.get(index, len(row))), row):
+                with col:
+                    values[f.column] = _render_field(st, f)
+    return values
+
+
+def _render_field(st, f):
+    if f.widget == "select":
+        return st.selectbox(f.widget_label, list(f.options), key=f.key, help=f.help)
+    if f.widget == "date":
+        return st.date_input(f.widget_label, value=datetime.now(), key=f.key, help=f.help).strftime("%Y-%m-%d")
+    return st.text_input(f.widget_label, placeholder=f.placeholder, key=f.key, help=f.help)
+
+
+def _compile_validator(f):
+    """Build a vectorized check for one field: Series of values -> Series of error messages."""
+
+    def validate(values):
+        text = values.fillna("").astype(str).str.strip()
+        is_na = text.str.upper().isin(NA_VALUES)
+        errors = pd.Series("", index=values.index)
+        if f.required:
+            errors = errors.mask(is_na, "is required")
+        if f.kind == "choice":
+            errors = errors.mask(~is_na & ~text.isin(f.options), "is not one of " + ", ".join(f.options))
+        if f.kind not in ("number", "integer"):
+            return errors
+        # A single comma with no dot is a decimal comma ("1,5" -> 1.5); any other
+        # comma (thousands separators, "1,000.5") is rejected as ambiguous
+        decimal_comma = (text.str.count(",") == 1) & ~text.str.contains(".", regex=False)
+        numbers = pd.to_numeric(text.mask(decimal_comma, text.str.replace(",", ".", regex=False)), errors="coerce")
+        # to_numeric also accepts "inf" and "nan"; treat them as not a number
+        numbers = numbers.where(np.isfinite(numbers))
+        errors = errors.mask(~is_na & numbers.isna(), "must be a number or N/A")
+        if f.kind == "integer":
+            # "1e3" parses to 1000.0, but is not how anyone types a whole number
+            not_whole = (numbers % 1 != 0) | text.str.contains("e", case=False, regex=False)
+            errors = errors.mask(~is_na & numbers.notna() & not_whole, "must be a whole number")
+        if f.min_value is not None:
+            errors = errors.mask(numbers < f.min_value, f"must be at least {f.min_value}")
+        if f.max_value is not None:
+            errors = errors.mask(numbers > f.max_value, f"must be at most {f.max_value}")
+        return errors
+
+    return validate
+
+
+# Compiled once at import; Streamlit keeps imported modules across reruns
+VALIDATORS = {f.column: _compile_validator(f) for f in FIELDS}
+
+
+def validate_rows(rows):
+    """Validate a batch of row dicts; return a list of (row index, column, message)."""
+    df = pd.DataFrame.from_records(list(rows))
+    problems = []
+    for column, validate in VALIDATORS.items():
+        if column not in df:
+            continue
+        errors = validate(df[column])
+        for index, message in errors[errors != ""].items():
+            problems.append((index, column, message))
+    problems.sort()
+    return problems
@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+SECRET_FILE = ".session_secret"
+
+# Tokens travel in the page URL, so anyone holding a copied link is signed in
+# until the token expires or the user logs out (which revokes all their tokens).
+TOKEN_TTL_SECONDS = 12 * 3600
+
+# How long the user directory trusts its cache before checking for changes
+# made by other processes
+DIRECTORY_REFRESH_SECONDS = 30
+
+
+def load_secret(secret_file=SECRET_FILE):
+    """Signing key from APP_SECRET_KEY, or a key generated once and kept on disk."""
+    secret = os.environ.get("APP_SECRET_KEY")
+    if secret:
+        return secret.encode("utf-8")
+    try:
+        # O_EXCL: if another process creates the file first, use its key
+        fd = os.open(secret_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    for _ in range(50):
+        with open(secret_file) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret.encode("utf-8")
+        # Another process created the file but has not written the key yet
+        time.sleep(0.02)
+    raise RuntimeError(f"{secret_file} is empty; delete it or set APP_SECRET_KEY")
+
+
+def _sign(payload, secret):
+    return hmac.new(secret, payload, hashlib.sha256).hexdigest()
+
+
+def issue_token(email, epoch, secret, ttl=TOKEN_TTL_SECONDS):
+    """Signed session token carrying the email, the user's session epoch and an expiry time."""
+    payload = f"{email}|{int(time.time()) + ttl}|{epoch}".encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii") + "." + _sign(payload, secret)
+
+
+def verify_token(token, secret):
+    """(email, epoch) of a valid, unexpired token, otherwise None."""
+    try:
+        encoded, signature = token.rsplit(".", 1)
+        payload = base64.urlsafe_b64decode(encoded.encode("ascii"))
+        if not hmac.compare_digest(_sign(payload, secret), signature):
+            return None
+        email, expires, epoch = payload.decode("utf-8").rsplit("|", 2)
+        if int(expires) < time.time():
+            return None
+        return email, int(epoch)
+    except (ValueError, UnicodeError):
+        return None
+
+
+class UserDirectory:
+    """In-memory map of known users to their session epoch, loaded from storage.
+
+    Lookups are answered from memory. At most every DIRECTORY_REFRESH_SECONDS,
+    whenever a lookup misses and before accepting a session token, the users
+    change counter is checked and the directory reloaded if another process
+    changed the users table. Only users not yet known cause a write.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._users = None
+        self._counter = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _sync(self, force=False):
+        now = time.monotonic()
+        if self._users is not None and not force and now - self._checked_at < DIRECTORY_REFRESH_SECONDS:
+            return
+        self._checked_at = now
+        counter = self.storage.change_counter("users")
+        if self._users is None or counter != self._counter:
+            self._users = dict(self.storage.list_users())
+            self._counter = counter
+
+    def session_epoch(self, email):
+        """Current session epoch of a user, or None if unknown."""
+        with self._lock:
+            self._sync()
+            return self._users.get(email)
+
+    def session_valid(self, email, epoch):
+        """True if a token with this epoch has not been revoked."""
+        with self._lock:
+            # Always check the counter: a logout in another process must take effect at once
+            self._sync(force=True)
+            return self._users.get(email) == epoch
+
+    def ensure(self, email):
+        """Register the user if unknown; return True if they were new."""
+        with self._lock:
+            self._sync()
+            if email not in self._users:
+                self._sync(force=True)
+            if email in self._users:
+                return False
+            self.storage.add_user(email)
+            self._users[email] = 0
+            return True
+
+    def revoke_sessions(self, email):
+        """Invalidate every token issued to the user so far."""
+        with self._lock:
+            epoch = self.storage.revoke_sessions(email)
+            if epoch is None:
+                # Removed from storage in the meantime; no token can be valid
+                self._users.pop(email, None)
+            else:
+                self._users[email] = epoch
+
+
+def sign_in(st, directory, email, secret):
+    """Register the user if needed and keep them signed in across refreshes."""
+    directory.ensure(email)
+    st.session_state.current_user = email
+    st.query_params["session"] = issue_token(email, directory.session_epoch(email), secret)
+
+
+def sign_out(st, directory):
+    """Revoke the user's tokens and forget them in this browser session."""
+    if st.session_state.current_user is not None:
+        directory.revoke_sessions(st.session_state.current_user)
+    st.query_params.clear()
+    st.session_state.current_user = None
+
+
+def restore_session(st, directory, secret):
+    """Sign the user back in from the token in the URL after a browser refresh."""
+    if st.session_state.current_user is not None or "session" not in st.query_params:
+        return False
+    verified = verify_token(st.query_params["session"], secret)
+    if verified is None or not directory.session_valid(*verified):
+        st.query_params.clear()
+        return False
+    st.session_state.current_user = verified[0]
+    return True
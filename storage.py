@@ -0,0 +1,304 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # optional columnar engine for analytics
+    duckdb = None
+
+from experiment_archive import ARCHIVE_FILE, DEFAULT_MAX_AGE_DAYS, archive_old_experiments, get_archived_experiments, restore_experiment
+from experiment_merge import DEFAULT_MERGE_KEY, key_value, load_experiments, merge_experiments, parse_experiment_data
+from experiment_versions import SaveConflict
+
+ANALYTICS_FILE = "experiments_analytics.duckdb"
+
+# Exceptions a storage call can raise for database problems, for pages to catch
+STORAGE_ERRORS = (sqlite3.Error,) if duckdb is None else (sqlite3.Error, duckdb.Error)
+
+# Concurrent rebuilds of the DuckDB mirror hit catalog write-write conflicts
+_mirror_lock = threading.Lock()
+
+
+class SQLiteStorage:
+    """Transactional experiment store backed by one SQLite file, plus its archive."""
+
+    def __init__(self, db_file, archive_file=ARCHIVE_FILE):
+        self.db_file = db_file
+        self.archive_file = archive_file
+
+    def init_db(self):
+        """Create tables and indexes, migrating older databases in place."""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                email TEXT PRIMARY KEY,
+                session_epoch INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Databases created before session revocation lack the column
+        cursor.execute("PRAGMA table_info(users)")
+        if "session_epoch" not in {column[1] for column in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE users ADD COLUMN session_epoch INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS experiments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT,
+                experiment_type TEXT,
+                experiment_name TEXT,
+                date TEXT,
+                data TEXT,
+                version INTEGER NOT NULL DEFAULT 1,
+                last_modified TEXT,
+                FOREIGN KEY (email) REFERENCES users (email)
+            )
+        """)
+        # Databases created before versioning / modification tracking lack the columns
+        cursor.execute("PRAGMA table_info(experiments)")
+        columns = {column[1] for column in cursor.fetchall()}
+        if "version" not in columns:
+            cursor.execute("ALTER TABLE experiments ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        if "last_modified" not in columns:
+            cursor.execute("ALTER TABLE experiments ADD COLUMN last_modified TEXT")
+            cursor.execute("UPDATE experiments SET last_modified = date")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_experiments_email ON experiments (email)")
+        # Monotonic change counter maintained by triggers, so readers can detect any write.
+        # It starts at a random value so a recreated database never matches a stale mirror.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS change_counters (
+                name TEXT PRIMARY KEY,
+                counter INTEGER NOT NULL
+            )
+        """)
+        for table in ("experiments", "users"):
+            cursor.execute("INSERT OR IGNORE INTO change_counters (name, counter) VALUES (?, ?)",
+                           (table, secrets.randbits(48)))
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_changed_{event.lower()} AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE change_counters SET counter = counter + 1 WHERE name = '{table}';
+                    END
+                """)
+        conn.commit()
+        conn.close()
+
+    def add_user(self, email):
+        """Register a user if not already present."""
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("INSERT OR IGNORE INTO users (email) VALUES (?)", (email,))
+        conn.commit()
+        conn.close()
+
+    def list_users(self):
+        """(email, session epoch) of all registered users."""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("SELECT email, session_epoch FROM users")
+        users = cursor.fetchall()
+        conn.close()
+        return users
+
+    def revoke_sessions(self, email):
+        """Bump the user's session epoch, invalidating their tokens.
+
+        Returns the new epoch, or None if the user no longer exists.
+        """
+        conn = sqlite3.connect(self.db_file)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE users SET session_epoch = session_epoch + 1 WHERE email = ?", (email,))
+            cursor.execute("SELECT session_epoch FROM users WHERE email = ?", (email,))
+            row = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        return None if row is None else row[0]
+
+    def save_experiment(self, email, experiment_type, experiment_name, date, data):
+        """Save a new experiment."""
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("INSERT INTO experiments (email, experiment_type, experiment_name, date, data, last_modified) VALUES (?, ?, ?, ?, ?, ?)",
+                     (email, experiment_type, experiment_name, date, data, date))
+        conn.commit()
+        conn.close()
+
+    def get_experiments(self, email):
+        """Retrieve (id, type, name, date, data, version) for all experiments of a user."""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, experiment_type, experiment_name, date, data, version FROM experiments WHERE email = ?", (email,))
+        experiments = cursor.fetchall()
+        conn.close()
+        return experiments
+
+    def list_all_experiments(self):
+        """Retrieve (id, email, name, date) for every experiment, newest first."""
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, email, experiment_name, date FROM experiments ORDER BY date DESC")
+        experiments = cursor.fetchall()
+        conn.close()
+        return experiments
+
+    def update_experiment(self, exp_id, experiment_name, data, version):
+        """Update an existing experiment if it is still at the given version.
+
+        Returns the new version. Raises SaveConflict with the stored state if
+        someone else saved the experiment in the meantime.
+        """
+        conn = sqlite3.connect(self.db_file)
+        cursor = conn.cursor()
+        cursor.execute("UPDATE experiments SET experiment_name = ?, data = ?, version = version + 1, last_modified = ? WHERE id = ? AND version = ?",
+                       (experiment_name, data, datetime.now().isoformat(), exp_id, version))
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT experiment_name, data, version FROM experiments WHERE id = ?", (exp_id,))
+            current = cursor.fetchone()
+            conn.close()
+            if current is None:
+                raise SaveConflict(exp_id, None, [], None)
+            raise SaveConflict(exp_id, current[0], parse_experiment_data(current[1]), current[2])
+        conn.commit()
+        conn.close()
+        return version + 1
+
+    def load_experiments(self, experiment_ids=None):
+        """Load (id, name, rows) for the given experiments, or all of them."""
+        return load_experiments(self.db_file, experiment_ids)
+
+    def merged_experiments(self, experiment_ids=None, key=DEFAULT_MERGE_KEY, source_column="Source experiment"):
+        """Master sheet of the given experiments, de-duplicated by key."""
+        return merge_experiments(self.load_experiments(experiment_ids), key=key, source_column=source_column)
+
+    def change_counter(self, table):
+        """Counter that increases whenever a row of the table is added, removed or updated."""
+        conn = sqlite3.connect(self.db_file)
+        counter = conn.execute("SELECT counter FROM change_counters WHERE name = ?", (table,)).fetchone()
+        conn.close()
+        return counter[0]
+
+    def data_signature(self):
+        """Fingerprint of the experiments data, for the analytics mirror."""
+        return str(self.change_counter("experiments"))
+
+    def archive_old_experiments(self, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        """Move experiments not modified for max_age_days to the archive; returns the job report."""
+        return archive_old_experiments(self.db_file, self.archive_file, max_age_days)
+
+    def get_archived_experiments(self, email):
+        """Retrieve (id, type, name, date, data) for all archived experiments of a user."""
+        return get_archived_experiments(email, self.db_file, self.archive_file)
+
+    def restore_experiment(self, exp_id):
+        """Move one archived experiment back into the main database."""
+        restore_experiment(exp_id, self.db_file, self.archive_file)
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class DuckDBStorage(SQLiteStorage):
+    """SQLite for transactional reads and writes, DuckDB for analytics and export.
+
+    Every experiment row is mirrored into DuckDB, rebuilt whenever the SQLite
+    change counter moves. Each mirrored row keeps its original values as JSON
+    next to normalized key columns, so the merge returns the same columns and
+    value types as SQLiteStorage.merged_experiments.
+    """
+
+    def __init__(self, db_file, archive_file=ARCHIVE_FILE, analytics_file=ANALYTICS_FILE):
+        super().__init__(db_file, archive_file)
+        self.analytics_file = analytics_file
+
+    def _analytics_connection(self):
+        """Open the DuckDB mirror, refreshing it first if SQLite changed."""
+        conn = duckdb.connect(self.analytics_file)
+        try:
+            with _mirror_lock:
+                signature = self.data_signature()
+                conn.execute("CREATE TABLE IF NOT EXISTS mirror_state (signature VARCHAR)")
+                stored = conn.execute("SELECT signature FROM mirror_state").fetchone()
+                if stored is None or stored[0] != signature:
+                    self._rebuild_mirror(conn, signature)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _rebuild_mirror(self, conn, signature):
+        records, column_orders = [], []
+        for exp_position, (exp_id, exp_name, rows) in enumerate(super().load_experiments()):
+            seen = {}
+            for row in rows:
+                record = {"_experiment_id": exp_id, "_position": len(records), "_source": exp_name,
+                          "_row": json.dumps(row, ensure_ascii=False, default=str)}
+                for column, value in row.items():
+                    seen.setdefault(column, len(seen))
+                    record[column] = key_value(value)
+                records.append(record)
+            # First-seen column order within the experiment, for the union schema
+            column_orders.extend((exp_id, exp_position * 100000 + index, column) for column, index in seen.items())
+
+        frame = pd.DataFrame.from_records(
+            records, columns=None if records else ["_experiment_id", "_position", "_source", "_row"])
+        columns_frame = pd.DataFrame(column_orders, columns=["_experiment_id", "_order", "column_name"])
+        conn.register("mirror_frame", frame)
+        conn.register("columns_frame", columns_frame)
+        conn.execute("CREATE OR REPLACE TABLE experiment_rows AS SELECT * FROM mirror_frame")
+        conn.execute("CREATE OR REPLACE TABLE experiment_columns AS SELECT * FROM columns_frame")
+        conn.unregister("mirror_frame")
+        conn.unregister("columns_frame")
+        conn.execute("DELETE FROM mirror_state")
+        conn.execute("INSERT INTO mirror_state VALUES (?)", [signature])
+
+    def merged_experiments(self, experiment_ids=None, key=DEFAULT_MERGE_KEY, source_column="Source experiment"):
+        """Same result as SQLiteStorage.merged_experiments, with the de-duplication done by DuckDB."""
+        key = list(key)
+        conn = self._analytics_connection()
+        mirrored = {row[0] for row in conn.execute("DESCRIBE experiment_rows").fetchall()}
+        key_values = [f"coalesce({_quote(column)}, '')" if column in mirrored else "''" for column in key]
+        has_key = " OR ".join(f"{value} <> ''" for value in key_values) or "FALSE"
+        partition = ", ".join(key_values) or "NULL"
+
+        where, params = "", []
+        if experiment_ids is not None:
+            where, params = "WHERE list_contains(?, _experiment_id)", [list(experiment_ids)]
+        winners = conn.execute(f"""
+            SELECT _source, _row FROM experiment_rows {where}
+            QUALIFY NOT ({has_key}) OR row_number() OVER (PARTITION BY {partition} ORDER BY _position DESC) = 1
+            ORDER BY NOT ({has_key}), _position
+        """, params).fetchall()
+        # Union of the columns the selected experiments actually have, in first-seen order
+        union = [row[0] for row in conn.execute(f"""
+            SELECT column_name FROM experiment_columns {where}
+            GROUP BY column_name ORDER BY min(_order)
+        """, params).fetchall()]
+        conn.close()
+
+        columns = dict.fromkeys(([source_column] if source_column else []) + key + union)
+        if source_column:
+            records = [{source_column: source, **json.loads(row)} for source, row in winners]
+        else:
+            records = [json.loads(row) for _, row in winners]
+        return pd.DataFrame.from_records(records, columns=list(columns))
+
+
+def get_storage(db_file, archive_file=ARCHIVE_FILE, analytics_file=ANALYTICS_FILE):
+    """Plain SQLite unless STORAGE_BACKEND=duckdb is set and duckdb is installed.
+
+    SQLite stays the default: with the parse cache it merges faster than the
+    DuckDB mirror, which is rebuilt in full after every save (see
+    benchmark_storage.py).
+    """
+    if os.environ.get("STORAGE_BACKEND", "").lower() == "duckdb":
+        if duckdb is None:
+            raise RuntimeError("STORAGE_BACKEND=duckdb is set but duckdb is not installed")
+        return DuckDBStorage(db_file, archive_file, analytics_file)
+    return SQLiteStorage(db_file, archive_file)
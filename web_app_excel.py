@@ -2,8 +2,14 @@
 import streamlit as st
 import pandas as pd
 import sqlite3
-from datetime import datetime
 import io
+from experiment_saving import MISSING_EXPERIMENT, leave_experiment_form, open_experiment, render_save_conflict, save_experiment
+from experiment_versions import SaveConflict
+from form_schema import COLUMNS, render_form_sections, validate_rows
+from experiment_import import apply_diff, diff_rows, read_workbook_rows
+from experiment_merge import DEFAULT_MERGE_KEY, merged_to_excel_bytes, serialize_experiment_data
+from sessions import UserDirectory, load_secret, restore_session, sign_in, sign_out
+from storage import STORAGE_ERRORS, get_storage
 
 # --- SESSION STATE INITIALIZATION ---
 if 'current_user' not in st.session_state:
@@ -18,55 +24,13 @@ if 'experiment_data' not in st.session_state:
 # --- DATABASE SETUP ---
 DB_FILE = "experiments.db"
 
-def init_db():
-    """Initialize the SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            email TEXT PRIMARY KEY
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS experiments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT,
-            experiment_type TEXT,
-            experiment_name TEXT,
-            date TEXT,
-            data TEXT,
-            FOREIGN KEY (email) REFERENCES users (email)
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_experiment_to_db(email, experiment_type, experiment_name, date, data):
-    """Save experiment data to the database."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO experiments (email, experiment_type, experiment_name, date, data) VALUES (?, ?, ?, ?, ?)", 
-                   (email, experiment_type, experiment_name, date, data))
-    conn.commit()
-    conn.close()
-
-def get_experiments_from_db(email):
-    """Retrieve all experiments for a specific user."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, experiment_type, experiment_name, date, data FROM experiments WHERE email = ?", (email,))
-    experiments = cursor.fetchall()
-    conn.close()
-    return experiments
-
-def update_experiment_in_db(exp_id, experiment_name, data):
-    """Update an existing experiment in the database."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE experiments SET experiment_name = ?, data = ? WHERE id = ?", 
-                   (experiment_name, data, exp_id))
-    conn.commit()
-    conn.close()
+storage = get_storage(DB_FILE)
+SESSION_SECRET = load_secret()
+
+@st.cache_resource
+def get_user_directory():
+    """User directory shared by all sessions of this server process."""
+    return UserDirectory(storage)
 
 # --- CSS STYLES ---
 def set_page_style():
@@ -136,15 +100,8 @@ def login_page():
     
     if st.button("Login"):
         if email:
-            # Save user to DB if not already present
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute("INSERT OR IGNORE INTO users (email) VALUES (?)", (email,))
-            conn.commit()
-            conn.close()
-
-            # Set current user and navigate to welcome page
-            st.session_state.current_user = email
+            # Only genuinely new users cause a write; the URL token keeps them signed in across refreshes
+            sign_in(st, get_user_directory(), email, SESSION_SECRET)
             st.session_state.page = "welcome"
             st.rerun()
         else:
@@ -154,24 +111,40 @@ def welcome_page():
     """Improved welcome page."""
     st.title(f"Welcome, {st.session_state.current_user}")
 
+    if st.button("Log out", key="logout"):
+        sign_out(st, get_user_directory())
+        leave_experiment_form(st)
+        st.session_state.page = "login"
+        st.rerun()
+
     experiment_type = st.selectbox("Choose Experiment Type", ["Type 1"], key="experiment_type_select")
 
     # Fetch experiments from DB
     try:
-        experiments = get_experiments_from_db(st.session_state.current_user)
+        experiments = storage.get_experiments(st.session_state.current_user)
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return
 
     if experiments:
         st.subheader("My Experiments")
-        for exp_id, exp_type, exp_name, exp_date, exp_data in sorted(experiments, key=lambda x: x[3], reverse=True):
+        for exp_id, exp_type, exp_name, exp_date, exp_data, exp_version in sorted(experiments, key=lambda x: x[3], reverse=True):
             if st.button(f"Edit: {exp_name} ({exp_type}, Date: {exp_date})", key=f"edit_{exp_id}"):
-                st.session_state.experiment_id = exp_id
-                st.session_state.experiment_type = exp_type
-                st.session_state.experiment_name = exp_name
-                st.session_state.experiment_data = eval(exp_data)  # Convert string back to Python object
-                st.session_state.page = "experiment_form"
+                open_experiment(st, exp_id, exp_type, exp_name, exp_data, exp_version)
+                st.rerun()
+
+    # Archived experiments live in a separate file, only attached when asked for
+    if st.checkbox("Show archived experiments", key="show_archived"):
+        try:
+            archived = storage.get_archived_experiments(st.session_state.current_user)
+        except sqlite3.Error as e:
+            st.error(f"Database error: {e}")
+            archived = []
+        if not archived:
+            st.info("No archived experiments.")
+        for exp_id, exp_type, exp_name, exp_date, exp_data in sorted(archived, key=lambda x: x[3], reverse=True):
+            if st.button(f"Restore: {exp_name} ({exp_type}, Date: {exp_date})", key=f"restore_{exp_id}"):
+                storage.restore_experiment(exp_id)
                 st.rerun()
 
     if st.button("Start New Experiment"):
@@ -182,259 +155,88 @@ def welcome_page():
         st.session_state.page = "experiment_form"
         st.rerun()
 
+    if st.button("Combine Experiments"):
+        st.session_state.page = "combine"
+        st.rerun()
+
+def combine_page():
+    """Merge experiments from all technicians into one master sheet."""
+    st.title("Combine Experiments")
+
+    if st.button("Back to Home", key="back_home_combine"):
+        st.session_state.page = "welcome"
+        st.rerun()
+
+    try:
+        available = storage.list_all_experiments()
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+        return
+
+    if not available:
+        st.info("No experiments to combine yet.")
+        return
+
+    labels = {exp_id: f"{exp_name} ({email}, Date: {exp_date})" for exp_id, email, exp_name, exp_date in available}
+    selected_ids = st.multiselect(
+        "Experiments", list(labels), format_func=labels.get, key="combine_ids",
+        help="Leave empty to combine all experiments."
+    )
+    merge_key = st.multiselect(
+        "De-duplicate rows by", ["#Num", "Labeling", "Date", "Protein type", "Name"],
+        default=list(DEFAULT_MERGE_KEY), key="combine_key"
+    )
+
+    if st.button("Combine"):
+        try:
+            st.session_state.combined_df = storage.merged_experiments(selected_ids or None, key=merge_key)
+        except STORAGE_ERRORS as e:
+            st.error(f"Database error: {e}")
+            return
+
+    if st.session_state.get("combined_df") is not None:
+        df = st.session_state.combined_df
+        st.write(df)
+        st.download_button(
+            label="Download master_data.xlsx",
+            data=merged_to_excel_bytes(df),
+            file_name="master_data.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
 def experiment_form():
     """Form to collect experiment details."""
     st.title(f"Experiment {st.session_state.experiment_type} Data Collection")
 
     if st.button("Back to Home", key="back_home"):
-        st.session_state.page = "welcome"
+        leave_experiment_form(st)
         st.rerun()
 
     experiment_name = st.text_input("Experiment Name", value=st.session_state.get("experiment_name", ""))
+
+    if not render_save_conflict(st, storage, experiment_name):
+        return
     
     with st.form(key="experiment_form"):
-        st.subheader("Procedure - Settings")
-        col1, col2, col3, col4, col5 = st.columns(5)
-        with col1:
-            procedure_num = st.text_input("#Num", placeholder="1-Infinity", key="procedure_num")
-        with col2:
-            procedure_date = st.date_input("Date", value=datetime.now(), key="procedure_date")
-        with col3:
-            procedure_labeling = st.text_input("Labeling", key="procedure_labeling")
-        with col4:
-            protein_type = st.selectbox("Protein type", ["Type A", "Type B", "Type C"], key="protein_type")
-        with col5:
-            protein_concentration = st.text_input("Concentration [wt/wt%]", key="protein_concentration")
-
-        st.subheader("Procedure - Physical Treatments")
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            right_valve = st.text_input("Right valve [bar]", placeholder="Number (If used) or N/A", key="right_valve")
-        with col2:
-            left_valve = st.text_input("Left valve 2 [bar]", placeholder="Number (If used) or N/A", key="left_valve")
-        with col3:
-            temp_after_HPH = st.text_input("Temp after HPH [°C]", placeholder="Number (If used) or N/A", key="temp_after_HPH")
-        with col4:
-            HPH_fraction = st.text_input("HPH fraction [%]", placeholder="Number (If used) or N/A", key="HPH_fraction")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            initial_water_temp = st.text_input("Initial water temp", placeholder="Number (If used) or N/A", key="initial_water_temp")
-        with col2:
-            acid_name = st.text_input("Acid name", placeholder="Name (If used) or N/A", key="acid_name")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            mixing_temp = st.text_input("Mixing temp[°C]", placeholder="Number (If used) or N/A", key="mixing_temp")
-        with col2:
-            mixing_time = st.text_input("Mixing time", placeholder="Number (If used) or N/A", key="mixing_time")
-        heat_treatment_fraction = st.text_input("Heat treatment fraction[%]", placeholder="Number (If used) or N/A", key="heat_treatment_fraction")
-        ph = st.text_input("pH", placeholder="Number (If used) or N/A", key="ph")
-
-        st.subheader("Black box ? + Procedure - Enzymes Hydrolyzing")
-        col1, col2 = st.columns(2)
-        with col1:
-            enz_YN = st.selectbox("Y/N", ["Yes", "No"], key="enz_YN")
-        with col2:
-            enz_num = st.text_input("Enz num.", placeholder="Number (If used) or N/A", key="enz_num")
-
-        enz_name = st.selectbox("Name", ["Enzyme A", "Enzyme B"], key="enz_name")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            enz_concentration = st.text_input("Concentration [%]", placeholder="Number (If used) or N/A", key="enz_concentration")
-        with col2:
-            enz_added = st.text_input("Added enz [g]", placeholder="Number (If used) or N/A", key="enz_added")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            enz_addition_temp = st.text_input("Addition temp [°C]", placeholder="Number (If used) or N/A", key="enz_addition_temp")
-        with col2:
-            enz_ino_time = st.text_input("Ino. time [min]", placeholder="Number (If used) or N/A", key="enz_ino_time")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            enz_ino_temp = st.text_input("Ino. temp. [°C]", placeholder="Number (If used) or N/A", key="enz_ino_temp")
-        with col2:
-            enz_stirring = st.text_input("stirring [RPM]", placeholder="Number (If used) or N/A", key="enz_stirring")
-        black_box_protein_fraction = st.text_input("black box protein fraction[%]", placeholder="Number (If used) or N/A", key="black_box_protein_fraction")
-
-        st.subheader("Procedure - Enzymes Crosslinking")
-        col1, col2 = st.columns(2)
-        with col1:
-            cross_enz_name = st.selectbox("Name", ["Crosslinker X", "Crosslinker Y"], key="cross_enz_name")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            cross_enz_num = st.text_input("Enz num.", placeholder="Number (If used) or N/A", key="cross_enz_num")
-        with col2:
-            cross_enz_concentration = st.text_input("Concentration [%]", placeholder="Number (If used) or N/A", key="cross_enz_concentration")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            cross_enz_added = st.text_input("Added enz [g]", placeholder="Number (If used) or N/A", key="cross_enz_added")
-        with col2:
-            cross_enz_addition_temp = st.text_input("Addition temp [°C]", placeholder="Number (If used) or N/A", key="cross_enz_addition_temp")
-
-        col1, col2 = st.columns(2)
-        with col1:
-            cross_enz_ino_time = st.text_input("Inc. time [min]", placeholder="Number (If used) or N/A", key="cross_enz_ino_time")
-        with col2:
-            cross_enz_ino_temp = st.text_input("Inc. temp. [°C]", placeholder="Number (If used) or N/A", key="cross_enz_ino_temp")
-        cross_enz_stirring = st.text_input("stirring [RPM]", placeholder="Number (If used) or N/A", key="cross_enz_stirring")
-
-        st.subheader("Gel / Drying process")
-        col1, col2 = st.columns(2)
-        with col1:
-            gel_or_drying = st.selectbox("G/D", ["Drying", "Gel"], key="gel_or_drying")
-
-        col1, col2 = st.columns(2)
-        with col1:
-           o_n_incubation = st.selectbox("o.n incubation at 4 °C (Y/N)", ["Yes", "No"], key="o_n_incubation")
-        with col2:
-            drying_method = st.selectbox("Drying type", ["Freeze dry", "Spray dry","N/A"], key="drying_method")
-
-                # Gel Functionality Section
-        st.subheader("Gel Functionality")
-        col1, col2, col3, col4, col5, col6, col7 = st.columns([1.5, 1.5, 1.5, 2, 2, 2, 2])
-        with col1:
-            fresh_rehydrated = st.text_input(
-                "Fresh/rehydrated", 
-                placeholder="Enter value", 
-                key="fresh_rehydrated",
-                help="Specify whether the gel is fresh or rehydrated."
-            )
-        with col2:
-            added_protein = st.text_input(
-                "Added protein?", 
-                placeholder="Number (if used) or N/A", 
-                key="added_protein",
-                help="Enter the amount of added protein or specify 'N/A'."
-            )
-        with col3:
-            added_protein_type = st.text_input(
-                "Added protein type", 
-                placeholder="Type (if used) or N/A", 
-                key="added_protein_type",
-                help="Specify the type of added protein or 'N/A'."
-            )
-        with col4:
-            meal_water_ratio = st.text_input(
-                "Meal:water:added protein ratio", 
-                placeholder="Ratio (if used) or N/A", 
-                key="meal_water_ratio",
-                help="Provide the ratio of meal to water to added protein."
-            )
-        with col5:
-            rehydration_equipment = st.text_input(
-                "Rehydration equipment", 
-                placeholder="Enter equipment", 
-                key="rehydration_equipment",
-                help="Specify the equipment used for rehydration."
-            )
-        with col6:
-            stress_max_load = st.text_input(
-                "Stress at Maximum Load (KPa)", 
-                placeholder="Insert average stress", 
-                key="stress_max_load",
-                help="Enter the average stress at maximum load in KPa."
-            )
-        with col7:
-            strain_max_load = st.text_input(
-                "Percentage Strain at Maximum Load", 
-                placeholder="Insert average strain", 
-                key="strain_max_load",
-                help="Enter the average strain percentage at maximum load."
-            )
-        
-        # TPA & Sensory Tests Section
-        st.subheader("TPA & Sensory Tests")
-        col1, col2, col3, col4, col5, col6 = st.columns([1.5, 1.5, 1.5, 1.5, 1.5, 1.5])
-        with col1:
-            tpa1 = st.text_input(
-                "TPA1", 
-                placeholder="Enter TPA1 value", 
-                key="tpa1",
-                help="Enter the first TPA (Texture Profile Analysis) value."
-            )
-        with col2:
-            tpa = st.text_input(
-                "TPA", 
-                placeholder="Enter TPA value", 
-                key="tpa",
-                help="Enter the second TPA (Texture Profile Analysis) value."
-            )
-        with col3:
-            chewiness = st.text_input(
-                "Chewiness", 
-                placeholder="Enter chewiness value", 
-                key="chewiness",
-                help="Provide a chewiness score based on sensory analysis."
-            )
-        with col4:
-            hardness = st.text_input(
-                "Hardness", 
-                placeholder="Enter hardness value", 
-                key="hardness",
-                help="Provide a hardness score based on sensory analysis."
-            )
-        with col5:
-            juiciness = st.text_input(
-                "Juiciness", 
-                placeholder="Enter juiciness value", 
-                key="juiciness",
-                help="Provide a juiciness score based on sensory analysis."
-            )
-        with col6:
-            mushiness = st.text_input(
-                "Mushiness", 
-                placeholder="Enter mushiness value", 
-                key="mushiness",
-                help="Provide a mushiness score based on sensory analysis."
-            )
+        form_data = render_form_sections(st)
 
         if st.form_submit_button("Save Form"):
-            form_data = {
-                "#Num": procedure_num,
-                "Date": procedure_date.strftime("%Y-%m-%d"),
-                "Labeling": procedure_labeling,
-                "Protein type": protein_type,
-                "Concentration [wt/wt%]": protein_concentration,
-                "Right valve [bar]": right_valve,
-                "Left valve 2 [bar]": left_valve,
-                "Temp after HPH [°C]": temp_after_HPH,
-                "HPH fraction [%]": HPH_fraction,
-                "Initial water temp": initial_water_temp,
-                "Mixing temp[°C]": mixing_temp,
-                "Mixing time": mixing_time,
-                "Heat treatment fraction[%]": heat_treatment_fraction,
-                "pH": ph,
-                "Y/N": enz_YN,
-                "Enz num.": enz_num,
-                "Name": enz_name,
-                "Concentration [%]": enz_concentration,
-                "Added enz [g]": enz_added,
-                "Addition temp [°C]": enz_addition_temp,
-                "Ino. time [min]": enz_ino_time,
-                "Ino. temp. [°C]": enz_ino_temp,
-                "stirring [RPM]": enz_stirring,
-                "black box protein fraction[%]": black_box_protein_fraction,
-                "Crosslinker Name": cross_enz_name,
-                "Crosslinker Enz num.": cross_enz_num,
-                "Crosslinker Concentration [%]": cross_enz_concentration,
-                "Crosslinker Added enz [g]": cross_enz_added,
-                "Crosslinker Addition temp [°C]": cross_enz_addition_temp,
-                "Crosslinker Ino. time [min]": cross_enz_ino_time,
-                "Crosslinker Ino. temp. [°C]": cross_enz_ino_temp,
-                "Crosslinker stirring [RPM]": cross_enz_stirring,
-            }
-            st.session_state.experiment_data.append(form_data)
-            st.success("Form saved successfully!")
+            problems = validate_rows([form_data])
+            if problems:
+                for _, column, message in problems:
+                    st.error(f"{column} {message}.")
+            else:
+                st.session_state.experiment_data.append(form_data)
+                st.success("Form saved successfully!")
 
     if st.session_state.experiment_data:
-        df = pd.DataFrame(st.session_state.experiment_data)
+        df = pd.DataFrame(st.session_state.experiment_data).reindex(columns=COLUMNS)
         st.write(df)
 
+        problems = validate_rows(st.session_state.experiment_data)
+        if problems:
+            st.warning("\n".join(f"Row {index + 1}: {column} {message}." for index, column, message in problems))
+
         if st.button("Export to Excel"):
             excel_buffer = io.BytesIO()
             with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
@@ -454,27 +256,78 @@ def experiment_form():
             except Exception as e:
                 st.error(f"Error creating/downloading Excel file: {e}")
 
+        if st.session_state.get("experiment_id") is not None:
+            edited_file = st.file_uploader("Import edits", type=["xlsx"], key="import_edits_file",
+                                           help="Upload a corrected export of this experiment; only changed cells are saved.")
+            if edited_file is not None and st.button("Preview edits"):
+                try:
+                    st.session_state.import_preview = diff_rows(st.session_state.experiment_data, read_workbook_rows(edited_file))
+                except Exception as e:
+                    st.error(f"Error reading Excel file: {e}")
+                    return
+
+            preview = st.session_state.get("import_preview")
+            if preview is not None:
+                changes, added, unmatched = preview
+                if not changes and not added:
+                    st.info("No differences found.")
+                    del st.session_state.import_preview
+                else:
+                    st.write(pd.DataFrame(
+                        [(index + 1, column, old, new) for index, column, old, new in changes],
+                        columns=["Row", "Column", "Old value", "New value"]
+                    ))
+                    if added:
+                        st.write(f"{len(added)} new rows will be added:")
+                        st.write(pd.DataFrame(added).reindex(columns=COLUMNS))
+                    if unmatched:
+                        st.warning(f"{len(unmatched)} stored rows were not found in the sheet and will be kept unchanged:")
+                        st.write(pd.DataFrame([st.session_state.experiment_data[index] for index in unmatched],
+                                              index=[index + 1 for index in unmatched]).reindex(columns=COLUMNS))
+                    # Imported values get the same checks as the form; block the ones this import introduces
+                    new_rows = apply_diff(st.session_state.experiment_data, changes, added)
+                    changed_cells = {(index, column) for index, column, _, _ in changes}
+                    stored_count = len(st.session_state.experiment_data)
+                    invalid = [(index, column, message) for index, column, message in validate_rows(new_rows)
+                               if index >= stored_count or (index, column) in changed_cells]
+                    if invalid:
+                        st.error("Fix these values in the sheet and preview again:\n" + "\n".join(
+                            f"Row {index + 1}: {column} {message}." for index, column, message in invalid))
+                    # New or unmatched rows may mean a row was not recognised; make the user look first
+                    confirmed = not (added or unmatched) or st.checkbox(
+                        "I checked the new and unmatched rows above", key="import_confirm")
+                    if st.button("Apply edits", disabled=bool(invalid) or not confirmed):
+                        del st.session_state.import_preview
+                        try:
+                            # One UPDATE, so the whole diff is applied in a single transaction
+                            st.session_state.experiment_version = storage.update_experiment(
+                                st.session_state.experiment_id, experiment_name, serialize_experiment_data(new_rows), st.session_state.experiment_version)
+                        except SaveConflict as conflict:
+                            st.session_state.experiment_data = new_rows
+                            if conflict.current_version is None:
+                                st.error(MISSING_EXPERIMENT)
+                                return
+                            st.session_state.save_conflict = conflict
+                            st.rerun()
+                        st.session_state.experiment_data = new_rows
+                        st.session_state.experiment_base_data = list(new_rows)
+                        st.session_state.experiment_base_name = experiment_name
+                        st.success(f"Imported {len(changes)} changed cells and {len(added)} new rows.")
+
         if st.button("Save Experiment"):
-            # Save or update the experiment in DB
-            serialized_data = str(st.session_state.experiment_data)  # Convert list to string for storage
-            
-            if 'experiment_id' in st.session_state and st.session_state.experiment_id is not None:
-                update_experiment_in_db(st.session_state.experiment_id, experiment_name, serialized_data)
-                st.success(f"Experiment '{experiment_name}' updated successfully!")
-            else:
-                save_experiment_to_db(st.session_state.current_user, st.session_state.experiment_type, experiment_name, datetime.now().isoformat(), serialized_data)
-                st.success(f"Experiment '{experiment_name}' saved successfully!")
-            
+            if not save_experiment(st, storage, experiment_name):
+                return
+
             # Navigate back to home page after saving
-            del st.session_state.experiment_id  # Reset ID for next use
-            del st.session_state.experiment_data  # Clear current session's data
-            del st.session_state.experiment_name  # Clear current session's name
-            
-            st.session_state.page = "welcome"
+            leave_experiment_form(st)
             st.rerun()
 
 # Initialize database on startup
-init_db()
+storage.init_db()
+
+# Restore a signed-in user after a browser refresh
+if restore_session(st, get_user_directory(), SESSION_SECRET):
+    st.session_state.page = "welcome"
 
 # Set page style
 set_page_style()
@@ -486,3 +339,5 @@ elif st.session_state.page == "welcome":
     welcome_page()
 elif st.session_state.page == "experiment_form":
     experiment_form()
+elif st.session_state.page == "combine":
+    combine_page()